@@ -11,20 +11,32 @@ Generates realistic synthetic EHR data including:
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from faker import Faker
-from datetime import datetime, timedelta
-import random
+from numba import njit, prange
+from datetime import datetime
+from string import Formatter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 import json
 
-# Set seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+# Set seed for reproducibility; each generation stage draws from its own
+# child of this seed so stages can run in parallel worker processes
+SEED = 42
 fake = Faker('en_US')
-Faker.seed(42)
+Faker.seed(SEED)
 
 START_DATE = datetime(2024, 1, 1)
 END_DATE = datetime(2026, 1, 27)
 
+# Number of distinct clinical note authors to generate
+AUTHOR_POOL_SIZE = 1000
+
+OUTPUT_DIR = '/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation'
+
 # ICD-10 codes for conditions
 ICD10_CODES = {
     'Hypertension': 'I10',
@@ -102,6 +114,20 @@ LAB_TESTS_BY_CONDITION = {
     ]
 }
 
+# Lab specs flattened to one row per (condition, test component)
+LAB_SPECS = pd.DataFrame(
+    [
+        (condition, test_name, component, min_val, max_val, unit, f"{min_val}-{max_val}")
+        for condition, test_list in LAB_TESTS_BY_CONDITION.items()
+        for test_name, component, min_val, max_val, unit in test_list
+    ],
+    columns=['condition', 'test_name', 'test_component', 'min_val', 'max_val', 'unit', 'reference_range']
+)
+
+# Chance a lab result is out of range, indexed by the patient's condition
+# count (capped at 3): none, one, two, three or more
+ABERRANT_RATE_BY_CONDITION_COUNT = np.array([0.0, 0.05, 0.10, 0.20], dtype=np.float32)
+
 # Immunizations per ACIP guidelines
 IMMUNIZATIONS = {
     'childhood': [
@@ -121,256 +147,383 @@ IMMUNIZATIONS = {
     ]
 }
 
-def generate_labs(patient_id, conditions, age):
+# Value pools for per-row categorical fields (repeated entries act as weights)
+DIAGNOSIS_STATUSES = np.array(['Active', 'Active', 'Active', 'Resolved'])
+PERFORMING_LABS = np.array(['Quest Diagnostics', 'LabCorp', 'Hospital Lab'])
+NOTE_TYPES = np.array(['SOAP', 'SOAP', 'Progress', 'Progress', 'Consultation'])
+CONSULT_SPECIALTIES = np.array(['Cardiology', 'Endocrinology', 'Pulmonology', 'Neurology'])
+DEPARTMENTS = np.array(['Primary Care', 'Internal Medicine', 'Family Medicine', 'Specialty Clinic'])
+ROUTES = np.array(['Intramuscular', 'Subcutaneous'])
+SITES = np.array(['Left deltoid', 'Right deltoid', 'Left thigh', 'Right thigh'])
+CHILDHOOD_MANUFACTURERS = np.array(['Pfizer', 'Moderna', 'GSK', 'Merck', 'Sanofi'])
+FLU_MANUFACTURERS = np.array(['Sanofi', 'GSK', 'Seqirus'])
+TDAP_MANUFACTURERS = np.array(['Sanofi', 'GSK'])
+COVID_MANUFACTURERS = np.array(['Pfizer', 'Moderna'])
+
+def compile_template(template):
+    """Parse a note template once into (is_field, text) parts for fill_template"""
+    parts = []
+    for literal, field, _, _ in Formatter().parse(template):
+        if literal:
+            parts.append((False, literal))
+        if field is not None:
+            parts.append((True, field))
+    return parts
+
+def fill_template(template, fields):
+    """Assemble one string per row from a compiled template and a dict of Arrow string columns"""
+    return pc.binary_join_element_wise(*[fields[text] if is_field else text for is_field, text in template], '')
+
+# Clinical note templates, compiled once at import ({field} placeholders are
+# filled element-wise with Arrow's string join kernel)
+SUBJECTIVE_TEMPLATES = [compile_template(template) for template in (
+    "Patient presents for follow-up of {conditions}. Reports feeling generally well.",
+    "Patient seen for management of {conditions}. No new complaints today.",
+    "{age}-year-old {gender} with history of {conditions} presents for routine follow-up."
+)]
+SOAP_TEMPLATE = compile_template(
+    "SUBJECTIVE:\\n{subjective}\\n\\nOBJECTIVE:\\n"
+    "Vital Signs: BP {systolic}/{diastolic}, HR {heart_rate}, RR {respiratory_rate}, "
+    "Temp {temperature}°F, O2 Sat {o2_sat}% on room air. General: Alert and oriented. Well-appearing. "
+    "Physical exam unremarkable for stated conditions."
+    "\\n\\nASSESSMENT:\\n{assessment}\\n\\n{plan}"
+)
+PROGRESS_TEMPLATES = [compile_template(template) for template in (
+    "Progress Note:\\nPatient: {name}, {age}yo {gender}\\n"
+    "Chief Complaint: Follow-up {conditions}\\n"
+    "Patient continues management of {conditions}. "
+    "Current medications reviewed and refilled as appropriate. "
+    "Patient counseled on importance of medication adherence and lifestyle modifications. "
+    "No acute concerns at this time. Will continue current plan of care.",
+    "Visit Note:\\n{name} seen today for {conditions} management. "
+    "Patient reports good adherence to medications. "
+    "Reviewed recent lab results with patient. "
+    "Plan to continue current regimen and follow up as scheduled."
+)]
+CONSULTATION_TEMPLATE = compile_template(
+    "Consultation Note - {specialist}\\n"
+    "Patient: {name}, {age}yo {gender}\\n"
+    "Reason for Consultation: {conditions}\\n\\n"
+    "Thank you for this consultation. I have reviewed the patient's history and examination. "
+    "Patient has been managing {conditions}. "
+    "I recommend continuation of current therapy with close monitoring. "
+    "Will coordinate care with primary care provider."
+)
+
+def sample(rng, pool, n):
+    """Draw n values uniformly (with replacement) from a NumPy value pool"""
+    return pool[rng.integers(0, len(pool), n)]
+
+def generate_npis(rng, n):
+    """Generate n random 10-digit NPI strings"""
+    return np.char.mod('%d', rng.integers(1_000_000_000, 10_000_000_000, n))
+
+def generate_diagnoses(pharmacy_patients, seed):
+    """Generate ICD-10 coded diagnoses, one per patient condition"""
+    rng = np.random.default_rng(seed)
+    patient_conditions = pharmacy_patients.explode('condition_list').rename(columns={'condition_list': 'condition'})
+    patient_conditions = patient_conditions[patient_conditions['condition'].isin(list(ICD10_CODES))]
+    num_diagnoses = len(patient_conditions)
+    
+    diagnosis_dates = pd.Timestamp(START_DATE) + pd.to_timedelta(rng.integers(-730, 1, num_diagnoses), unit='D')
+    return pd.DataFrame({
+        'patient_id': patient_conditions['patient_id'].to_numpy(),
+        'diagnosis_code': patient_conditions['condition'].map(ICD10_CODES).to_numpy(),
+        'diagnosis_description': patient_conditions['condition'].to_numpy(),
+        'diagnosis_date': diagnosis_dates,
+        'status': sample(rng, DIAGNOSIS_STATUSES, num_diagnoses),
+        'is_chronic': np.where(patient_conditions['condition'].isin(['Hypertension', 'Type 2 Diabetes', 'Asthma']), 'Yes', 'No'),
+        'diagnosing_provider_npi': generate_npis(rng, num_diagnoses)
+    })
+
+@njit(parallel=True, fastmath=True, cache=True)
+def generate_lab_values(min_val, max_val, patient_idx, aberrant_rate, u_aberrant, u_below, u_value, values, is_aberrant):
+    """Fill lab values and aberrant flags from uniform draws in one fused pass
+
+    All inputs are float32 and the constants are typed to match, so the loop
+    stays in single precision (values are only reported to 2 decimals).
+    aberrant_rate holds one precomputed rate per patient, looked up through
+    patient_idx, so the loop body carries no condition-count branches.
+    """
+    half = np.float32(0.5)
+    spread = np.float32(0.45)
+    above = np.float32(1.05)
+    for i in prange(values.size):
+        if u_aberrant[i] < aberrant_rate[patient_idx[i]]:
+            is_aberrant[i] = True
+            if u_below[i] < half:
+                # Below range: 50-95% of the lower limit
+                values[i] = min_val[i] * (half + spread * u_value[i])
+            else:
+                # Above range: 105-150% of the upper limit
+                values[i] = max_val[i] * (above + spread * u_value[i])
+        else:
+            is_aberrant[i] = False
+            values[i] = min_val[i] + (max_val[i] - min_val[i]) * u_value[i]
+
+def generate_labs(pharmacy_patients, seed):
     """Generate lab results based on patient conditions"""
-    labs = []
+    rng = np.random.default_rng(seed)
+    conditions = pharmacy_patients['condition_list'].reset_index(drop=True)
+    patient_ids = pharmacy_patients['patient_id'].to_numpy()
     
-    # Determine number of condition-appropriate labs
-    num_conditions = len(conditions)
+    # Aberration rate by condition burden, resolved once per patient
+    num_conditions = conditions.str.len().to_numpy()
+    aberrant_rate = ABERRANT_RATE_BY_CONDITION_COUNT[np.minimum(num_conditions, 3)]
     
-    for condition in conditions:
-        if condition not in LAB_TESTS_BY_CONDITION:
-            continue
-        
-        test_list = LAB_TESTS_BY_CONDITION[condition]
-        
-        # Generate 2-4 lab results per year for patients with conditions
-        num_labs = random.randint(2, 4)
-        
-        for _ in range(num_labs):
-            test_date = START_DATE + timedelta(days=random.randint(0, 730))
-            
-            for test_name, component, min_val, max_val, unit in test_list:
-                # Determine if this result should be aberrant
-                is_aberrant = False
-                
-                # 5-15% aberration for patients with 3+ conditions
-                if num_conditions >= 3 and random.random() < 0.20:
-                    is_aberrant = True
-                # 5% aberration for patients with 2 conditions
-                elif num_conditions == 2 and random.random() < 0.10:
-                    is_aberrant = True
-                # 5% aberration for patients with 1 condition
-                elif num_conditions == 1 and random.random() < 0.05:
-                    is_aberrant = True
-                
-                if is_aberrant:
-                    # Generate aberrant value
-                    if random.random() < 0.5:
-                        # Below range
-                        value = round(random.uniform(min_val * 0.5, min_val * 0.95), 2)
-                    else:
-                        # Above range
-                        value = round(random.uniform(max_val * 1.05, max_val * 1.5), 2)
-                    flag = 'Abnormal'
-                else:
-                    # Normal range
-                    value = round(random.uniform(min_val, max_val), 2)
-                    flag = 'Normal'
-                
-                lab = {
-                    'patient_id': patient_id,
-                    'order_date': test_date.strftime('%Y-%m-%d'),
-                    'collection_date': test_date.strftime('%Y-%m-%d'),
-                    'result_date': (test_date + timedelta(days=random.randint(1, 3))).strftime('%Y-%m-%d'),
-                    'test_name': test_name,
-                    'test_component': component,
-                    'result_value': value,
-                    'unit': unit,
-                    'reference_range': f"{min_val}-{max_val}",
-                    'flag': flag,
-                    'ordering_provider_npi': f"{random.randint(1000000000, 9999999999)}",
-                    'performing_lab': random.choice(['Quest Diagnostics', 'LabCorp', 'Hospital Lab'])
-                }
-                labs.append(lab)
+    # Long-form (patient, condition) pairs for conditions with a lab panel
+    patient_conditions = conditions.explode().rename('condition').rename_axis('patient_idx').reset_index()
+    patient_conditions = patient_conditions[patient_conditions['condition'].isin(LAB_SPECS['condition'])]
     
-    return labs
+    # Generate 2-4 lab draws per patient condition, then join the panel specs
+    # so every component of the condition's panel is resulted for each draw
+    num_labs = rng.integers(2, 5, len(patient_conditions))
+    draws = patient_conditions.take(np.repeat(np.arange(len(patient_conditions)), num_labs))
+    draws = draws.assign(
+        order_date=pd.Timestamp(START_DATE) + pd.to_timedelta(rng.integers(0, 731, len(draws)), unit='D')
+    )
+    labs = draws.merge(LAB_SPECS, on='condition')
+    n = len(labs)
+    
+    draw_patients = labs['patient_idx'].to_numpy()
+    values = np.empty(n, dtype=np.float32)
+    is_aberrant = np.empty(n, dtype=np.bool_)
+    generate_lab_values(
+        labs['min_val'].to_numpy(dtype=np.float32),
+        labs['max_val'].to_numpy(dtype=np.float32),
+        draw_patients,
+        aberrant_rate,
+        rng.random(n, dtype=np.float32),
+        rng.random(n, dtype=np.float32),
+        rng.random(n, dtype=np.float32),
+        values, is_aberrant
+    )
+    
+    labs_df = pd.DataFrame({
+        'patient_id': patient_ids[draw_patients],
+        'order_date': labs['order_date'],
+        'collection_date': labs['order_date'],
+        'result_date': labs['order_date'] + pd.to_timedelta(rng.integers(1, 4, n), unit='D'),
+        'test_name': pd.Categorical(labs['test_name']),
+        'test_component': labs['test_component'],
+        'result_value': np.round(values, 2),
+        'unit': pd.Categorical(labs['unit']),
+        'reference_range': labs['reference_range'],
+        'flag': pd.Categorical(np.where(is_aberrant, 'Abnormal', 'Normal'), categories=['Normal', 'Abnormal']),
+        'ordering_provider_npi': generate_npis(rng, n),
+        'performing_lab': pd.Categorical(sample(rng, PERFORMING_LABS, n))
+    })
+    return labs_df.sort_values('patient_id', kind='stable', ignore_index=True)
 
-def generate_clinical_note(patient_id, patient_name, age, gender, conditions, note_type='Progress'):
-    """Generate realistic clinical notes"""
+def generate_clinical_notes(pharmacy_patients, seed):
+    """Generate realistic clinical notes (SOAP, progress, consultation)"""
+    rng = np.random.default_rng(seed)
+    patients = pharmacy_patients[pharmacy_patients['condition_list'].str.len() > 0]
+    conditions = patients['condition_list']
     
-    condition_text = ', '.join(conditions[:3]) if conditions else 'routine visit'
+    # Per-patient text fragments shared by every note written for that patient
+    patient_text = pd.DataFrame({
+        'patient_id': patients['patient_id'],
+        'name': patients['first_name'] + ' ' + patients['last_name'],
+        'age': patients['age'].astype(str),
+        'gender': patients['gender'],
+        'condition_text': conditions.str[:3].str.join(', '),
+        'assessment': 'Assessment: ' + conditions.str[:2].str.join(' - stable, ') + ' - stable',
+        'plan': 'Plan: Continue current medications as prescribed; '
+                'Follow up in 3 months or sooner if concerns; '
+                'Reinforced medication adherence and lifestyle modifications'
+                + np.where(patients['conditions'].str.contains('Type 2 Diabetes', regex=False),
+                           '; Recheck HbA1c in 3 months', '')
+                + np.where(patients['conditions'].str.contains('Hypertension', regex=False),
+                           '; Monitor blood pressure at home', '')
+    })
     
-    if note_type == 'SOAP':
-        # Subjective
-        subjective_templates = [
-            f"Patient presents for follow-up of {condition_text}. Reports feeling generally well.",
-            f"Patient seen for management of {condition_text}. No new complaints today.",
-            f"{age}-year-old {gender} with history of {condition_text} presents for routine follow-up."
-        ]
-        subjective = random.choice(subjective_templates)
-        
-        # Objective
-        vitals = f"BP {random.randint(110,140)}/{random.randint(70,90)}, HR {random.randint(60,90)}, " \
-                f"RR {random.randint(12,20)}, Temp {round(random.uniform(97.8, 99.2), 1)}°F, " \
-                f"O2 Sat {random.randint(95,100)}% on room air"
-        
-        objective = f"Vital Signs: {vitals}. General: Alert and oriented. Well-appearing. " \
-                   f"Physical exam unremarkable for stated conditions."
-        
-        # Assessment
-        assessment = f"Assessment: {', '.join([f'{c} - stable' for c in conditions[:2]])}" if conditions else "No acute concerns"
-        
-        # Plan
-        plan_items = [
-            "Continue current medications as prescribed",
-            "Follow up in 3 months or sooner if concerns",
-            "Reinforced medication adherence and lifestyle modifications"
-        ]
-        
-        if 'Type 2 Diabetes' in conditions:
-            plan_items.append("Recheck HbA1c in 3 months")
-        if 'Hypertension' in conditions:
-            plan_items.append("Monitor blood pressure at home")
-        
-        plan = "Plan: " + "; ".join(plan_items)
-        
-        note_text = f"SUBJECTIVE:\\n{subjective}\\n\\nOBJECTIVE:\\n{objective}\\n\\nASSESSMENT:\\n{assessment}\\n\\n{plan}"
+    # Generate 3-6 notes per patient over 2 years
+    num_notes = rng.integers(3, 7, len(patient_text))
+    notes = patient_text.take(np.repeat(np.arange(len(patient_text)), num_notes)).reset_index(drop=True)
+    n = len(notes)
+    fields = {
+        'name': pa.array(notes['name'], type=pa.string()),
+        'age': pa.array(notes['age'], type=pa.string()),
+        'gender': pa.array(notes['gender'], type=pa.string()),
+        'conditions': pa.array(notes['condition_text'], type=pa.string()),
+        'assessment': pa.array(notes['assessment'], type=pa.string()),
+        'plan': pa.array(notes['plan'], type=pa.string())
+    }
     
-    elif note_type == 'Progress':
-        templates = [
-            f"Progress Note:\\nPatient: {patient_name}, {age}yo {gender}\\n" \
-            f"Chief Complaint: Follow-up {condition_text}\\n" \
-            f"Patient continues management of {condition_text}. " \
-            f"Current medications reviewed and refilled as appropriate. " \
-            f"Patient counseled on importance of medication adherence and lifestyle modifications. " \
-            f"No acute concerns at this time. Will continue current plan of care.",
-            
-            f"Visit Note:\\n{patient_name} seen today for {condition_text} management. " \
-            f"Patient reports good adherence to medications. " \
-            f"Reviewed recent lab results with patient. " \
-            f"Plan to continue current regimen and follow up as scheduled."
-        ]
-        note_text = random.choice(templates)
+    # SOAP
+    subjective_variant = rng.integers(0, 3, n)
+    vitals = {
+        'systolic': rng.integers(110, 141, n),
+        'diastolic': rng.integers(70, 91, n),
+        'heart_rate': rng.integers(60, 91, n),
+        'respiratory_rate': rng.integers(12, 21, n),
+        'temperature': np.char.mod('%.1f', rng.uniform(97.8, 99.2, n)),
+        'o2_sat': rng.integers(95, 101, n)
+    }
+    fields.update({field: pc.cast(pa.array(values), pa.string()) for field, values in vitals.items()})
+    fields['subjective'] = pc.choose(subjective_variant, *[fill_template(t, fields) for t in SUBJECTIVE_TEMPLATES])
+    soap_text = fill_template(SOAP_TEMPLATE, fields)
+    
+    # Progress
+    progress_variant = rng.integers(0, 2, n)
+    progress_text = pc.choose(progress_variant, *[fill_template(t, fields) for t in PROGRESS_TEMPLATES])
+    
+    # Consultation
+    fields['specialist'] = pa.array(sample(rng, CONSULT_SPECIALTIES, n), type=pa.string())
+    consultation_text = fill_template(CONSULTATION_TEMPLATE, fields)
+    
+    note_type = pd.Categorical(sample(rng, NOTE_TYPES, n), categories=['SOAP', 'Progress', 'Consultation'])
+    note_text = pc.choose(note_type.codes, soap_text, progress_text, consultation_text)
+    note_dates = pd.Timestamp(START_DATE) + pd.to_timedelta(rng.integers(0, 731, n), unit='D')
     
-    elif note_type == 'Consultation':
-        specialist = random.choice(['Cardiology', 'Endocrinology', 'Pulmonology', 'Neurology'])
-        note_text = f"Consultation Note - {specialist}\\n" \
-                   f"Patient: {patient_name}, {age}yo {gender}\\n" \
-                   f"Reason for Consultation: {condition_text}\\n\\n" \
-                   f"Thank you for this consultation. I have reviewed the patient's history and examination. " \
-                   f"Patient has been managing {condition_text}. " \
-                   f"I recommend continuation of current therapy with close monitoring. " \
-                   f"Will coordinate care with primary care provider."
+    # Authors come from a fixed roster of Faker names rather than one Faker call per note
+    fake.seed_instance(int(rng.integers(2**32)))
+    author_pool = np.array([fake.name() for _ in range(min(n, AUTHOR_POOL_SIZE))])
     
-    return note_text
+    return pd.DataFrame({
+        'note_id': np.char.mod('NOTE%08d', np.arange(1, n + 1)),
+        'patient_id': notes['patient_id'],
+        'note_date': note_dates,
+        'note_type': note_type,
+        'note_text': note_text.to_numpy(zero_copy_only=False),
+        'author_npi': generate_npis(rng, n),
+        'author_name': sample(rng, author_pool, n),
+        'department': pd.Categorical(sample(rng, DEPARTMENTS, n))
+    })
 
-def generate_immunizations(patient_id, age):
+def build_immunization_records(rng, patient_ids, vaccine_name, cvx_code, admin_dates, dose_number,
+                               route, site, lot_prefix, manufacturer):
+    """Assemble immunization columns for one vaccine across many patients"""
+    n = len(patient_ids)
+    return {
+        'patient_id': patient_ids,
+        'vaccine_name': np.broadcast_to(vaccine_name, n),
+        'cvx_code': np.broadcast_to(cvx_code, n),
+        'administration_date': pd.DatetimeIndex(admin_dates).to_numpy(),
+        'dose_number': np.broadcast_to(np.int32(dose_number), n),
+        'route': np.broadcast_to(route, n),
+        'site': np.broadcast_to(site, n),
+        'lot_number': np.char.mod(f"{lot_prefix}%d", rng.integers(100000, 1000000, n)),
+        'manufacturer': np.broadcast_to(manufacturer, n),
+        'administered_by_npi': generate_npis(rng, n)
+    }
+
+def generate_immunizations(pharmacy_patients, seed):
     """Generate immunization records based on ACIP guidelines"""
-    immunizations = []
+    rng = np.random.default_rng(seed)
+    patient_ids = pharmacy_patients['patient_id'].to_numpy()
+    ages = pharmacy_patients['age'].to_numpy()
+    num_patients = len(patient_ids)
+    start, end, today = pd.Timestamp(START_DATE), pd.Timestamp(END_DATE), pd.Timestamp.today().normalize()
+    records = []
     
     # Assume 80% received all childhood vaccines
-    if random.random() < 0.80:
-        for vaccine, schedule in IMMUNIZATIONS['childhood']:
-            # Add historical childhood vaccines
-            admin_date = datetime.now() - timedelta(days=age*365) + timedelta(days=random.randint(90, 730))
-            if admin_date < START_DATE:
-                admin_date = START_DATE + timedelta(days=random.randint(0, 30))
-            
-            imm = {
-                'patient_id': patient_id,
-                'vaccine_name': vaccine,
-                'cvx_code': f"{random.randint(1, 200):03d}",
-                'administration_date': admin_date.strftime('%Y-%m-%d'),
-                'dose_number': 1,
-                'route': random.choice(['Intramuscular', 'Subcutaneous']),
-                'site': random.choice(['Left deltoid', 'Right deltoid', 'Left thigh', 'Right thigh']),
-                'lot_number': f"LOT{random.randint(100000, 999999)}",
-                'manufacturer': random.choice(['Pfizer', 'Moderna', 'GSK', 'Merck', 'Sanofi']),
-                'administered_by_npi': f"{random.randint(1000000000, 9999999999)}"
-            }
-            immunizations.append(imm)
+    childhood = rng.random(num_patients) < 0.80
+    childhood_vaccines = [vaccine for vaccine, _ in IMMUNIZATIONS['childhood']]
+    idx = np.repeat(np.flatnonzero(childhood), len(childhood_vaccines))
+    n = len(idx)
+    # Historical childhood vaccines are recorded at the start of the data window
+    admin_dates = today - pd.to_timedelta(ages[idx] * 365, unit='D') + pd.to_timedelta(rng.integers(90, 731, n), unit='D')
+    admin_dates = admin_dates.where(
+        admin_dates >= start,
+        start + pd.to_timedelta(rng.integers(0, 31, n), unit='D')
+    )
+    records.append(build_immunization_records(
+        rng,
+        patient_ids[idx],
+        np.tile(childhood_vaccines, childhood.sum()),
+        np.char.mod('%03d', rng.integers(1, 201, n)),
+        admin_dates,
+        1,
+        sample(rng, ROUTES, n),
+        sample(rng, SITES, n),
+        'LOT',
+        sample(rng, CHILDHOOD_MANUFACTURERS, n)
+    ))
     
     # Adult immunizations
-    # Flu shot (45% coverage)
-    if random.random() < 0.45:
-        for year in [2024, 2025]:
-            flu_date = datetime(year, random.randint(9, 11), random.randint(1, 28))
-            if START_DATE <= flu_date <= END_DATE:
-                imm = {
-                    'patient_id': patient_id,
-                    'vaccine_name': 'Influenza',
-                    'cvx_code': '141',
-                    'administration_date': flu_date.strftime('%Y-%m-%d'),
-                    'dose_number': 1,
-                    'route': 'Intramuscular',
-                    'site': 'Left deltoid',
-                    'lot_number': f"FLU{random.randint(100000, 999999)}",
-                    'manufacturer': random.choice(['Sanofi', 'GSK', 'Seqirus']),
-                    'administered_by_npi': f"{random.randint(1000000000, 9999999999)}"
-                }
-                immunizations.append(imm)
+    # Flu shot (45% coverage), one per season
+    flu = np.flatnonzero(rng.random(num_patients) < 0.45)
+    for year in [2024, 2025]:
+        flu_dates = pd.to_datetime({
+            'year': np.full(len(flu), year),
+            'month': rng.integers(9, 12, len(flu)),
+            'day': rng.integers(1, 29, len(flu))
+        })
+        in_window = ((flu_dates >= start) & (flu_dates <= end)).to_numpy()
+        records.append(build_immunization_records(
+            rng, patient_ids[flu[in_window]], 'Influenza', '141', flu_dates[in_window], 1,
+            'Intramuscular', 'Left deltoid', 'FLU',
+            sample(rng, FLU_MANUFACTURERS, in_window.sum())
+        ))
     
-    # Tdap (26% up to date)
-    if random.random() < 0.26:
-        tdap_date = datetime.now() - timedelta(days=random.randint(0, 3650))  # Within 10 years
-        if START_DATE <= tdap_date <= END_DATE:
-            imm = {
-                'patient_id': patient_id,
-                'vaccine_name': 'Td/Tdap',
-                'cvx_code': '115',
-                'administration_date': tdap_date.strftime('%Y-%m-%d'),
-                'dose_number': 1,
-                'route': 'Intramuscular',
-                'site': 'Left deltoid',
-                'lot_number': f"TDAP{random.randint(100000, 999999)}",
-                'manufacturer': random.choice(['Sanofi', 'GSK']),
-                'administered_by_npi': f"{random.randint(1000000000, 9999999999)}"
-            }
-            immunizations.append(imm)
+    # Tdap (26% up to date), given within the last 10 years
+    tdap = np.flatnonzero(rng.random(num_patients) < 0.26)
+    tdap_dates = today - pd.to_timedelta(rng.integers(0, 3651, len(tdap)), unit='D')
+    in_window = (tdap_dates >= start) & (tdap_dates <= end)
+    records.append(build_immunization_records(
+        rng, patient_ids[tdap[in_window]], 'Td/Tdap', '115', tdap_dates[in_window], 1,
+        'Intramuscular', 'Left deltoid', 'TDAP',
+        sample(rng, TDAP_MANUFACTURERS, in_window.sum())
+    ))
     
     # Shingles (33% of adults 50+)
-    if age >= 50 and random.random() < 0.33:
-        shingles_date = START_DATE + timedelta(days=random.randint(0, 730))
-        imm = {
-            'patient_id': patient_id,
-            'vaccine_name': 'Shingles (Shingrix)',
-            'cvx_code': '187',
-            'administration_date': shingles_date.strftime('%Y-%m-%d'),
-            'dose_number': 1,
-            'route': 'Intramuscular',
-            'site': 'Left deltoid',
-            'lot_number': f"SHING{random.randint(100000, 999999)}",
-            'manufacturer': 'GSK',
-            'administered_by_npi': f"{random.randint(1000000000, 9999999999)}"
-        }
-        immunizations.append(imm)
+    shingles = np.flatnonzero((ages >= 50) & (rng.random(num_patients) < 0.33))
+    records.append(build_immunization_records(
+        rng, patient_ids[shingles], 'Shingles (Shingrix)', '187',
+        start + pd.to_timedelta(rng.integers(0, 731, len(shingles)), unit='D'), 1,
+        'Intramuscular', 'Left deltoid', 'SHING', 'GSK'
+    ))
     
     # Pneumococcal (64% of adults 65+)
-    if age >= 65 and random.random() < 0.64:
-        pneumo_date = START_DATE + timedelta(days=random.randint(0, 730))
-        imm = {
-            'patient_id': patient_id,
-            'vaccine_name': 'Pneumococcal (PPSV23)',
-            'cvx_code': '033',
-            'administration_date': pneumo_date.strftime('%Y-%m-%d'),
-            'dose_number': 1,
-            'route': 'Intramuscular',
-            'site': 'Left deltoid',
-            'lot_number': f"PNEU{random.randint(100000, 999999)}",
-            'manufacturer': 'Merck',
-            'administered_by_npi': f"{random.randint(1000000000, 9999999999)}"
-        }
-        immunizations.append(imm)
+    pneumo = np.flatnonzero((ages >= 65) & (rng.random(num_patients) < 0.64))
+    records.append(build_immunization_records(
+        rng, patient_ids[pneumo], 'Pneumococcal (PPSV23)', '033',
+        start + pd.to_timedelta(rng.integers(0, 731, len(pneumo)), unit='D'), 1,
+        'Intramuscular', 'Left deltoid', 'PNEU', 'Merck'
+    ))
     
     # COVID-19 (70% coverage)
-    if random.random() < 0.70:
-        covid_date = START_DATE + timedelta(days=random.randint(0, 730))
-        imm = {
-            'patient_id': patient_id,
-            'vaccine_name': 'COVID-19',
-            'cvx_code': '208',
-            'administration_date': covid_date.strftime('%Y-%m-%d'),
-            'dose_number': random.randint(1, 3),
-            'route': 'Intramuscular',
-            'site': 'Left deltoid',
-            'lot_number': f"COVID{random.randint(100000, 999999)}",
-            'manufacturer': random.choice(['Pfizer', 'Moderna']),
-            'administered_by_npi': f"{random.randint(1000000000, 9999999999)}"
-        }
-        immunizations.append(imm)
+    covid = np.flatnonzero(rng.random(num_patients) < 0.70)
+    records.append(build_immunization_records(
+        rng, patient_ids[covid], 'COVID-19', '208',
+        start + pd.to_timedelta(rng.integers(0, 731, len(covid)), unit='D'),
+        rng.integers(1, 4, len(covid), dtype=np.int32),
+        'Intramuscular', 'Left deltoid', 'COVID',
+        sample(rng, COVID_MANUFACTURERS, len(covid))
+    ))
     
-    return immunizations
+    immunizations_df = pd.DataFrame({
+        column: np.concatenate([record[column] for record in records]) for column in records[0]
+    })
+    for column in ['route', 'site', 'manufacturer']:
+        immunizations_df[column] = pd.Categorical(immunizations_df[column])
+    return immunizations_df.sort_values('patient_id', kind='stable', ignore_index=True)
+
+def write_csv(df, filename):
+    """Write a DataFrame to OUTPUT_DIR using PyArrow's native CSV writer"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Dates are held as datetime64 in memory and written out as YYYY-MM-DD
+    schema = pa.schema(
+        [field.with_type(pa.date32()) if pa.types.is_timestamp(field.type) else field for field in table.schema],
+        metadata=table.schema.metadata
+    )
+    pacsv.write_csv(table.cast(schema), f"{OUTPUT_DIR}/{filename}")
+
+def worker_context():
+    """Multiprocessing context for the generation workers
+
+    PyArrow and CSV writer threads are already running in this process, and
+    forking under their locks can deadlock the workers. Workers are forked from
+    a single-threaded forkserver with the heavy imports preloaded instead, or
+    spawned where forkserver is unavailable (Windows).
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['numpy', 'pandas', 'pyarrow.compute', 'faker', 'numba'])
+    return context
 
 def main():
     """Main execution function"""
@@ -379,127 +532,56 @@ def main():
     print("=" * 60)
     
     # Load pharmacy patient data to ensure matching demographics
-    print("\n[1/6] Loading pharmacy patient data...")
-    pharmacy_patients = pd.read_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/pharmacy_patients.csv', keep_default_na=False)
+    print("\n[1/4] Loading pharmacy patient data...")
+    patients_table = pq.read_table(f"{OUTPUT_DIR}/pharmacy_patients.parquet")
+    # Parse the pipe-delimited conditions once for every stage ('None' -> [])
+    conditions = patients_table['conditions']
+    condition_list = pc.split_pattern(pc.if_else(pc.equal(conditions, 'None'), None, conditions), '|')
+    condition_list = pc.fill_null(condition_list, pa.scalar([], type=condition_list.type))
+    pharmacy_patients = patients_table.to_pandas()
+    pharmacy_patients['condition_list'] = condition_list.to_pylist()
     print(f"   ✓ Loaded {len(pharmacy_patients)} patients from pharmacy system")
     
-    # Create EHR patient demographics (matching pharmacy)
-    print("\n[2/6] Creating EHR patient demographics...")
-    ehr_patients = []
-    for _, patient in pharmacy_patients.iterrows():
-        ehr_patient = {
-            'patient_id': patient['patient_id'],
-            'first_name': patient['first_name'],
-            'last_name': patient['last_name'],
-            'date_of_birth': patient['date_of_birth'],
-            'age': patient['age'],
-            'gender': patient['gender'],
-            'ssn': patient['ssn'],
-            'phone': patient['phone'],
-            'email': patient['email'],
-            'address': patient['address'],
-            'city': patient['city'],
-            'state': patient['state'],
-            'zip_code': patient['zip_code'],
-            'created_date': patient['created_date']
-        }
-        ehr_patients.append(ehr_patient)
-    
-    ehr_patients_df = pd.DataFrame(ehr_patients)
-    print(f"   ✓ Created {len(ehr_patients_df)} EHR patient records")
-    
-    # Generate diagnoses
-    print("\n[3/6] Generating diagnoses...")
-    diagnoses = []
-    for _, patient in pharmacy_patients.iterrows():
-        conditions = patient['conditions'].split('|') if patient['conditions'] != 'None' else []        
-        for condition in conditions:
-            if condition in ICD10_CODES:
-                diagnosis = {
-                    'patient_id': patient['patient_id'],
-                    'diagnosis_code': ICD10_CODES[condition],
-                    'diagnosis_description': condition,
-                    'diagnosis_date': (START_DATE + timedelta(days=random.randint(-730, 0))).strftime('%Y-%m-%d'),
-                    'status': random.choice(['Active', 'Active', 'Active', 'Resolved']),
-                    'is_chronic': 'Yes' if condition in ['Hypertension', 'Type 2 Diabetes', 'Asthma'] else 'No',
-                    'diagnosing_provider_npi': f"{random.randint(1000000000, 9999999999)}"
-                }
-                diagnoses.append(diagnosis)
-    
-    diagnoses_df = pd.DataFrame(diagnoses)
-    print(f"   ✓ Generated {len(diagnoses_df)} diagnoses")
-    
-    # Generate lab results
-    print("\n[4/6] Generating laboratory results...")
-    all_labs = []
-    for _, patient in pharmacy_patients.iterrows():
-        conditions = patient['conditions'].split('|') if patient['conditions'] != 'NaN' else []
-        if conditions and conditions[0] != 'None':
-            patient_labs = generate_labs(patient['patient_id'], conditions, patient['age'])
-            all_labs.extend(patient_labs)
-    
-    labs_df = pd.DataFrame(all_labs)
-    print(f"   ✓ Generated {len(labs_df)} lab results")
-    
-    # Generate clinical notes
-    print("\n[5/6] Generating clinical notes...")
-    clinical_notes = []
-    note_counter = 1
-    for _, patient in pharmacy_patients.iterrows():
-        conditions = patient['conditions'].split('|') if patient['conditions'] != 'None' else []
-        if not conditions or conditions[0] == 'None':
-            continue
-        
-        # Generate 3-6 notes per patient over 2 years
-        num_notes = random.randint(3, 6)
+    # CSV writes run on background threads as soon as each table is ready,
+    # overlapping disk I/O with the remaining generation work
+    with ThreadPoolExecutor(max_workers=5) as writer:
+        # Create EHR patient demographics (matching pharmacy)
+        print("\n[2/4] Creating EHR patient demographics...")
+        ehr_patients_df = pharmacy_patients[[
+            'patient_id', 'first_name', 'last_name', 'date_of_birth', 'age', 'gender', 'ssn',
+            'phone', 'email', 'address', 'city', 'state', 'zip_code', 'created_date'
+        ]].astype({'age': 'int32'})
+        writes = [writer.submit(write_csv, ehr_patients_df, 'ehr_patients.csv')]
+        print(f"   ✓ Created {len(ehr_patients_df)} EHR patient records")
         
-        for _ in range(num_notes):
-            note_date = START_DATE + timedelta(days=random.randint(0, 730))
-            note_type = random.choice(['SOAP', 'SOAP', 'Progress', 'Progress', 'Consultation'])
+        # The remaining stages only read the pharmacy patients, so they run in
+        # parallel worker processes, each seeded from its own child seed
+        print("\n[3/4] Generating diagnoses, labs, clinical notes and immunizations...")
+        diagnoses_seed, labs_seed, notes_seed, immunizations_seed = np.random.SeedSequence(SEED).spawn(4)
+        with ProcessPoolExecutor(max_workers=4, mp_context=worker_context()) as executor:
+            diagnoses_future = executor.submit(generate_diagnoses, pharmacy_patients, diagnoses_seed)
+            labs_future = executor.submit(generate_labs, pharmacy_patients, labs_seed)
+            notes_future = executor.submit(generate_clinical_notes, pharmacy_patients, notes_seed)
+            immunizations_future = executor.submit(generate_immunizations, pharmacy_patients, immunizations_seed)
             
-            note_text = generate_clinical_note(
-                patient['patient_id'],
-                f"{patient['first_name']} {patient['last_name']}",
-                patient['age'],
-                patient['gender'],
-                conditions,
-                note_type
-            )
-            
-            note = {
-                'note_id': f"NOTE{note_counter:08d}",
-                'patient_id': patient['patient_id'],
-                'note_date': note_date.strftime('%Y-%m-%d'),
-                'note_type': note_type,
-                'note_text': note_text,
-                'author_npi': f"{random.randint(1000000000, 9999999999)}",
-                'author_name': fake.name(),
-                'department': random.choice(['Primary Care', 'Internal Medicine', 'Family Medicine', 'Specialty Clinic'])
-            }
-            clinical_notes.append(note)
-            note_counter += 1
-    
-    notes_df = pd.DataFrame(clinical_notes)
-    print(f"   ✓ Generated {len(notes_df)} clinical notes")
-    
-    # Generate immunizations
-    print("\n[6/6] Generating immunization records...")
-    all_immunizations = []
-    for _, patient in pharmacy_patients.iterrows():
-        patient_imms = generate_immunizations(patient['patient_id'], patient['age'])
-        all_immunizations.extend(patient_imms)
-    
-    immunizations_df = pd.DataFrame(all_immunizations)
-    print(f"   ✓ Generated {len(immunizations_df)} immunization records")
-    
-    # Save all data
-    print("\n[7/7] Saving data to CSV files...")
-    ehr_patients_df.to_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/ehr_patients.csv', index=False)
-    diagnoses_df.to_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/ehr_diagnoses.csv', index=False)
-    labs_df.to_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/ehr_labs.csv', index=False)
-    notes_df.to_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/ehr_clinical_notes.csv', index=False)
-    immunizations_df.to_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/ehr_immunizations.csv', index=False)
-    print("   ✓ All files saved successfully")
+            diagnoses_df = diagnoses_future.result()
+            writes.append(writer.submit(write_csv, diagnoses_df, 'ehr_diagnoses.csv'))
+            print(f"   ✓ Generated {len(diagnoses_df)} diagnoses")
+            labs_df = labs_future.result()
+            writes.append(writer.submit(write_csv, labs_df, 'ehr_labs.csv'))
+            print(f"   ✓ Generated {len(labs_df)} lab results")
+            notes_df = notes_future.result()
+            writes.append(writer.submit(write_csv, notes_df, 'ehr_clinical_notes.csv'))
+            print(f"   ✓ Generated {len(notes_df)} clinical notes")
+            immunizations_df = immunizations_future.result()
+            writes.append(writer.submit(write_csv, immunizations_df, 'ehr_immunizations.csv'))
+            print(f"   ✓ Generated {len(immunizations_df)} immunization records")
+        
+        # Wait for all writes (re-raising any write error)
+        print("\n[4/4] Saving data to CSV files...")
+        for write in writes:
+            write.result()
+        print("   ✓ All files saved successfully")
     
     # Summary statistics
     print("\n" + "=" * 60)
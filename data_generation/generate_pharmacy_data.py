@@ -10,22 +10,27 @@ Generates realistic synthetic pharmacy data including:
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from faker import Faker
-from datetime import datetime, timedelta
-import random
+from numba import njit, prange
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import json
 import hashlib
 
-# Set seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+# Set seed for reproducibility; each generation stage draws from its own
+# child of this seed so its output does not depend on the other stages
+SEED = 42
 fake = Faker('en_US')
-Faker.seed(42)
+Faker.seed(SEED)
 
 # Configuration
 NUM_PATIENTS = 250
 START_DATE = datetime(2024, 1, 1)
 END_DATE = datetime(2026, 1, 27)
+ADDRESS_POOL_SIZE = 1024
+OUTPUT_DIR = '/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation'
 
 # Age distribution (representative of US population)
 AGE_DISTRIBUTION = {
@@ -175,6 +180,31 @@ DISEASE_MEDICATIONS = {
     }
 }
 
+GENDERS = np.array(['M', 'F', 'X'])
+
+# DISEASE_MEDICATIONS as parallel per-disease arrays (in dict order), with the
+# medications flattened: disease i owns MEDICATIONS[FIRST_MEDICATION[i]:][:MEDICATIONS_PER_DISEASE[i]]
+DISEASES = pd.Index(list(DISEASE_MEDICATIONS))
+DISEASE_PREVALENCE = np.array([info['prevalence'] for info in DISEASE_MEDICATIONS.values()])
+# Index into GENDERS of the only gender a disease applies to, or -1 for any
+DISEASE_GENDER = np.array([
+    list(GENDERS).index(info['gender']) if 'gender' in info else -1 for info in DISEASE_MEDICATIONS.values()
+])
+DISEASE_IS_REMS = np.array([info.get('rems', False) for info in DISEASE_MEDICATIONS.values()])
+MEDICATIONS_PER_DISEASE = np.array([len(info['medications']) for info in DISEASE_MEDICATIONS.values()])
+FIRST_MEDICATION = np.cumsum(MEDICATIONS_PER_DISEASE) - MEDICATIONS_PER_DISEASE
+MEDICATIONS = np.array([med for info in DISEASE_MEDICATIONS.values() for med in info['medications']])
+MEDICATION_NDCS = np.array([ndc for info in DISEASE_MEDICATIONS.values() for ndc in info['ndcs']])
+
+# Dosing class per medication: inhalers and insulin have their own quantity rules
+DOSING_STANDARD, DOSING_INHALER, DOSING_INSULIN = 0, 1, 2
+MEDICATION_DOSING_CLASS = np.array([
+    DOSING_INHALER if 'inhaler' in med.lower() or 'hfa' in med.lower()
+    else DOSING_INSULIN if 'insulin' in med.lower()
+    else DOSING_STANDARD
+    for med in MEDICATIONS
+])
+
 # Common drug allergies (representative prevalence)
 COMMON_ALLERGIES = {
     'Penicillin': 0.10,
@@ -211,6 +241,8 @@ INSURANCE_CARRIERS = [
     {'name': 'Medicare Part D', 'bin': '610455', 'pcn': 'MEDICARE', 'group_prefix': 'MD'},
     {'name': 'Medicaid', 'bin': '610014', 'pcn': 'MEDICAID', 'group_prefix': 'MC'}
 ]
+MEDICARE_CARRIER = next(c for c in INSURANCE_CARRIERS if 'Medicare' in c['name'])
+MEDICAID_CARRIER = next(c for c in INSURANCE_CARRIERS if 'Medicaid' in c['name'])
 
 # Insurance rejection codes
 REJECTION_CODES = {
@@ -224,305 +256,365 @@ REJECTION_CODES = {
     '88': 'DUR Reject - Drug-Drug Interaction',
     'MR': 'Max Quantity Exceeded'
 }
+REJECT_CODES = np.array(list(REJECTION_CODES))
+REJECT_MESSAGES = np.array(list(REJECTION_CODES.values()))
+
+# Prescription instructions (SIG)
+SIGS = np.array([
+    "Take 1 tablet by mouth daily",
+    "Take 1 tablet by mouth twice daily",
+    "Take 1 capsule by mouth once daily",
+    "Take 2 tablets by mouth twice daily",
+    "Inhale 2 puffs twice daily",
+    "Apply topically as directed",
+    "Take 1 tablet by mouth at bedtime",
+    "Take 1-2 tablets by mouth every 4-6 hours as needed",
+    "Inject subcutaneously as directed"
+])
+
+def sample(rng, pool, n):
+    """Draw n values uniformly (with replacement) from a NumPy value pool"""
+    return pool[rng.integers(0, len(pool), n)]
+
+def generate_ssns(rng, n):
+    """Generate n valid-format SSNs (not real)"""
+    area = np.char.mod('%03d-', rng.integers(1, 900, n))
+    group = np.char.mod('%02d-', rng.integers(1, 100, n))
+    serial = np.char.mod('%04d', rng.integers(1, 10000, n))
+    return np.char.add(np.char.add(area, group), serial)
+
+def generate_phones(rng, n):
+    """Generate n US phone numbers"""
+    area = np.char.mod('(%d) ', rng.integers(200, 1000, n))
+    exchange = np.char.mod('%d-', rng.integers(200, 1000, n))
+    number = np.char.mod('%d', rng.integers(1000, 10000, n))
+    return np.char.add(np.char.add(area, exchange), number)
+
+def sample_ages(rng, n):
+    """Draw n ages, picking a bracket by US demographics and then an age within it"""
+    bounds = np.array([[int(limit) for limit in bracket.split('-')] for bracket in AGE_DISTRIBUTION])
+    bracket = rng.choice(len(bounds), n, p=list(AGE_DISTRIBUTION.values()))
+    return rng.integers(bounds[bracket, 0], bounds[bracket, 1] + 1)
 
-def generate_ssn():
-    """Generate a valid-format SSN (not real)"""
-    area = random.randint(1, 899)
-    group = random.randint(1, 99)
-    serial = random.randint(1, 9999)
-    return f"{area:03d}-{group:02d}-{serial:04d}"
+def join_flagged(mask, labels, empty):
+    """Pipe-join the labels flagged in each row of a boolean mask, or `empty` where none are"""
+    joined = np.where(mask, np.array([f"{label}|" for label in labels], dtype=object), '').sum(axis=1)
+    return np.where(mask.any(axis=1), pd.Series(joined, dtype=object).str[:-1], empty)
 
-def generate_phone():
-    """Generate US phone number"""
-    area = random.randint(200, 999)
-    exchange = random.randint(200, 999)
-    number = random.randint(1000, 9999)
-    return f"({area}) {exchange}-{number}"
+@njit(parallel=True, cache=True)
+def sample_conditions(ages, gender_codes, prevalence, disease_gender, age_factors, u_condition, u_fallback, u_pick,
+                      has_condition):
+    """Fill the condition matrix from uniform draws, one patient per iteration
 
-def select_age_bracket():
-    """Select age bracket based on US demographics"""
-    brackets = list(AGE_DISTRIBUTION.keys())
-    probabilities = list(AGE_DISTRIBUTION.values())
-    bracket = np.random.choice(brackets, p=probabilities)
+    Streams each patient's diseases instead of building patients x diseases
+    eligibility and probability matrices; only the uniforms are preallocated.
+    """
+    for i in prange(ages.size):
+        any_condition = False
+        pick = 0
+        best = -2.0
+        for j in range(prevalence.size):
+            # Skip gender-specific conditions
+            if disease_gender[j] >= 0 and disease_gender[j] != gender_codes[i]:
+                score = -1.0
+            else:
+                # Calculate probability with age factor
+                if u_condition[i, j] < prevalence[j] * age_factors[ages[i], j]:
+                    has_condition[i, j] = True
+                    any_condition = True
+                score = u_pick[i, j]
+            if score > best:
+                best = score
+                pick = j
+        # Ensure at least 20% have multiple conditions: half of the patients with
+        # none get one condition drawn uniformly from those they are eligible for
+        if not any_condition and u_fallback[i] < 0.5:
+            has_condition[i, pick] = True
+
+def assign_conditions(rng, ages, gender_codes):
+    """Assign realistic conditions based on age and gender
+
+    Returns a (patients x diseases) boolean matrix in DISEASE_MEDICATIONS order.
+    """
+    # Evaluate each disease's age_factor once per possible age, then look up
+    age_factors = np.array([
+        [info['age_factor'](age) for info in DISEASE_MEDICATIONS.values()] for age in range(ages.max() + 1)
+    ])
     
-    # Generate age within bracket
-    age_range = bracket.split('-')
-    return random.randint(int(age_range[0]), int(age_range[1]))
+    shape = (len(ages), len(DISEASES))
+    u_condition = rng.random(shape)
+    u_fallback = rng.random(len(ages))
+    u_pick = rng.random(shape)
+    has_condition = np.zeros(shape, dtype=np.bool_)
+    sample_conditions(ages, gender_codes, DISEASE_PREVALENCE, DISEASE_GENDER, age_factors,
+                      u_condition, u_fallback, u_pick, has_condition)
+    return has_condition
+
+def generate_patient_demographics(seed):
+    """Generate patient demographic data
 
-def assign_conditions(age, gender):
-    """Assign realistic conditions based on age and gender"""
-    conditions = []
+    Returns the patients frame along with the (patients x diseases) condition
+    matrix it was built from, so later steps need not re-parse `conditions`.
+    """
+    rng = np.random.default_rng(seed)
+    ages = sample_ages(rng, NUM_PATIENTS)
+    birth_dates = (pd.Timestamp.now() - pd.to_timedelta(ages * 365.25, unit='D')).normalize()
     
-    for disease, info in DISEASE_MEDICATIONS.items():
-        # Skip gender-specific conditions
-        if 'gender' in info and info['gender'] != gender:
-            continue
-            
-        # Calculate probability with age factor
-        base_prevalence = info['prevalence']
-        age_adjusted = base_prevalence * info['age_factor'](age)
-        
-        if random.random() < age_adjusted:
-            conditions.append(disease)
+    # Gender distribution (~90% binary)
+    gender_codes = rng.choice(len(GENDERS), NUM_PATIENTS, p=[5/11, 5/11, 1/11])
+    genders = GENDERS[gender_codes]
     
-    # Ensure at least 20% have multiple conditions
-    if len(conditions) == 0 and random.random() < 0.5:
-        # Assign at least one condition
-        possible = [d for d, i in DISEASE_MEDICATIONS.items() 
-                   if 'gender' not in i or i['gender'] == gender]
-        conditions.append(random.choice(possible))
+    # Bind Faker providers once; names are still drawn per patient
+    fake.seed_instance(int(rng.integers(2**32)))
+    first_name_male, first_name_female, first_name = fake.first_name_male, fake.first_name_female, fake.first_name
+    first_names = pd.Series([
+        first_name_male() if gender == 'M' else first_name_female() if gender == 'F' else first_name()
+        for gender in genders
+    ])
+    last_name = fake.last_name
+    last_names = pd.Series([last_name() for _ in range(NUM_PATIENTS)])
     
-    return conditions
-
-def generate_patient_demographics():
-    """Generate patient demographic data"""
-    patients = []
+    # Addresses and email domains come from pools of pre-generated Faker values
+    # rather than one Faker call per patient (street addresses are only reused
+    # once there are more patients than the pool holds)
+    pool_size = min(NUM_PATIENTS, ADDRESS_POOL_SIZE)
+    email_domains = np.array([fake.free_email_domain() for _ in range(pool_size)])
+    street_addresses = np.array([fake.street_address() for _ in range(pool_size)])
+    cities = np.array([fake.city() for _ in range(pool_size)])
+    states = np.array([fake.state_abbr() for _ in range(pool_size)])
+    zip_codes = np.array([fake.zipcode() for _ in range(pool_size)])
     
-    for i in range(NUM_PATIENTS):
-        age = select_age_bracket()
-        birth_date = datetime.now() - timedelta(days=age*365.25)
-        
-        # Gender distribution
-        gender = random.choice(['M', 'F', 'M', 'F', 'M', 'F', 'M', 'F', 'M', 'F', 'X'])  # ~90% binary
-        
-        first_name = fake.first_name_male() if gender == 'M' else fake.first_name_female() if gender == 'F' else fake.first_name()
-        last_name = fake.last_name()
-        
-        # Assign conditions
-        conditions = assign_conditions(age, gender)
-        
-        # Assign allergies
-        drug_allergies = [allergy for allergy, prob in COMMON_ALLERGIES.items() 
-                         if random.random() < prob]
-        food_allergies = [allergy for allergy, prob in FOOD_ALLERGIES.items() 
-                         if random.random() < prob]
-        
-        patient = {
-            'patient_id': f"PT{i+1:05d}",
-            'first_name': first_name,
-            'last_name': last_name,
-            'date_of_birth': birth_date.strftime('%Y-%m-%d'),
-            'age': age,
-            'gender': gender,
-            'ssn': generate_ssn(),
-            'phone': generate_phone(),
-            'email': f"{first_name.lower()}.{last_name.lower()}@{fake.free_email_domain()}",
-            'address': fake.street_address(),
-            'city': fake.city(),
-            'state': fake.state_abbr(),
-            'zip_code': fake.zipcode(),
-            'conditions': '|'.join(conditions) if conditions else 'None',
-            'drug_allergies': '|'.join(drug_allergies) if drug_allergies else 'NKDA',
-            'food_allergies': '|'.join(food_allergies) if food_allergies else 'None',
-            'created_date': START_DATE.strftime('%Y-%m-%d')
-        }
-        
-        patients.append(patient)
+    # Assign conditions
+    conditions = assign_conditions(rng, ages, gender_codes)
+    
+    # Assign allergies, one independent draw per patient and allergen
+    drug_allergy_mask = rng.random((NUM_PATIENTS, len(COMMON_ALLERGIES))) < list(COMMON_ALLERGIES.values())
+    food_allergy_mask = rng.random((NUM_PATIENTS, len(FOOD_ALLERGIES))) < list(FOOD_ALLERGIES.values())
     
-    return pd.DataFrame(patients)
+    patients_df = pd.DataFrame({
+        'patient_id': np.char.mod('PT%05d', np.arange(1, NUM_PATIENTS + 1)),
+        'first_name': first_names,
+        'last_name': last_names,
+        'date_of_birth': birth_dates,
+        'age': ages,
+        'gender': pd.Categorical.from_codes(gender_codes, categories=GENDERS),
+        'ssn': generate_ssns(rng, NUM_PATIENTS),
+        'phone': generate_phones(rng, NUM_PATIENTS),
+        'email': first_names.str.lower() + '.' + last_names.str.lower() + '@'
+                 + sample(rng, email_domains, NUM_PATIENTS),
+        'address': rng.choice(street_addresses, NUM_PATIENTS, replace=NUM_PATIENTS > pool_size),
+        'city': sample(rng, cities, NUM_PATIENTS),
+        'state': pd.Categorical(sample(rng, states, NUM_PATIENTS)),
+        'zip_code': sample(rng, zip_codes, NUM_PATIENTS),
+        'conditions': join_flagged(conditions, DISEASES, 'None'),
+        'drug_allergies': join_flagged(drug_allergy_mask, list(COMMON_ALLERGIES), 'NKDA'),
+        'food_allergies': join_flagged(food_allergy_mask, list(FOOD_ALLERGIES), 'None'),
+        'created_date': pd.Timestamp(START_DATE)
+    })
+    return patients_df, conditions
 
-def generate_insurance_profiles(patients_df):
+def generate_insurance_profiles(patients_df, seed):
     """Generate insurance information for each patient"""
-    insurance_records = []
+    rng = np.random.default_rng(seed)
+    n = len(patients_df)
+    ages = patients_df['age'].to_numpy()
     
-    for _, patient in patients_df.iterrows():
-        # Number of insurance plans (1-3)
-        num_plans = np.random.choice([1, 2, 3], p=[0.70, 0.25, 0.05])
-        
-        # Primary insurance
-        carrier = random.choice(INSURANCE_CARRIERS)
-        
-        # Medicare for 65+
-        if patient['age'] >= 65:
-            carrier = [c for c in INSURANCE_CARRIERS if 'Medicare' in c['name']][0]
-        # Medicaid for some younger
-        elif patient['age'] < 65 and random.random() < 0.15:
-            carrier = [c for c in INSURANCE_CARRIERS if 'Medicaid' in c['name']][0]
-        
-        insurance = {
-            'patient_id': patient['patient_id'],
-            'insurance_rank': 'Primary',
-            'carrier_name': carrier['name'],
-            'rx_bin': carrier['bin'],
-            'rx_pcn': carrier['pcn'],
-            'rx_group': f"{carrier['group_prefix']}{random.randint(10000, 99999)}",
-            'cardholder_id': f"{random.randint(100000000, 999999999)}",
-            'person_code': str(random.randint(1, 4)).zfill(2),
-            'effective_date': START_DATE.strftime('%Y-%m-%d'),
-            'termination_date': None
-        }
-        insurance_records.append(insurance)
-        
-        # Secondary insurance (if applicable)
-        if num_plans >= 2:
-            secondary_carrier = random.choice([c for c in INSURANCE_CARRIERS if c != carrier])
-            insurance2 = {
-                'patient_id': patient['patient_id'],
-                'insurance_rank': 'Secondary',
-                'carrier_name': secondary_carrier['name'],
-                'rx_bin': secondary_carrier['bin'],
-                'rx_pcn': secondary_carrier['pcn'],
-                'rx_group': f"{secondary_carrier['group_prefix']}{random.randint(10000, 99999)}",
-                'cardholder_id': f"{random.randint(100000000, 999999999)}",
-                'person_code': str(random.randint(1, 4)).zfill(2),
-                'effective_date': START_DATE.strftime('%Y-%m-%d'),
-                'termination_date': None
-            }
-            insurance_records.append(insurance2)
+    # Number of insurance plans (1-3)
+    num_plans = rng.choice([1, 2, 3], n, p=[0.70, 0.25, 0.05])
     
-    return pd.DataFrame(insurance_records)
-
-def generate_prescriptions(patients_df):
-    """Generate prescription history"""
-    prescriptions = []
-    rx_counter = 1
+    # Primary insurance: Medicare for 65+, Medicaid for some younger
+    primary_carrier = rng.integers(0, len(INSURANCE_CARRIERS), n)
+    is_medicaid = (ages < 65) & (rng.random(n) < 0.15)
+    primary_carrier = np.select(
+        [ages >= 65, is_medicaid],
+        [INSURANCE_CARRIERS.index(MEDICARE_CARRIER), INSURANCE_CARRIERS.index(MEDICAID_CARRIER)],
+        default=primary_carrier
+    )
     
-    for _, patient in patients_df.iterrows():
-        conditions = patient['conditions'].split('|') if patient['conditions'] != 'None' else []
-        
-        if not conditions:
-            continue
-        
-        # Each patient gets 8-16 prescriptions over 2 years
-        num_prescriptions = random.randint(8, 16)
-        
-        for _ in range(num_prescriptions):
-            # Select a condition and medication
-            condition = random.choice(conditions)
-            med_info = DISEASE_MEDICATIONS[condition]
-            med_idx = random.randint(0, len(med_info['medications'])-1)
-            medication_name = med_info['medications'][med_idx]
-            ndc = med_info['ndcs'][med_idx]
-            
-            # Generate prescription dates
-            written_date = START_DATE + timedelta(days=random.randint(0, 730))
-            fill_date = written_date + timedelta(days=random.randint(0, 7))
-            
-            # Quantity and days supply
-            if 'inhaler' in medication_name.lower() or 'hfa' in medication_name.lower():
-                quantity = 1
-                days_supply = 30
-            elif 'insulin' in medication_name.lower():
-                quantity = random.choice([1, 3, 5])
-                days_supply = 30
-            else:
-                # 5% aberrant dosing
-                if random.random() < 0.05:
-                    quantity = random.randint(1, 500)  # Aberrant
-                    days_supply = random.randint(1, 180)
-                else:
-                    quantity = random.choice([30, 60, 90])
-                    days_supply = quantity
-            
-            # Instructions (SIG)
-            sigs = [
-                "Take 1 tablet by mouth daily",
-                "Take 1 tablet by mouth twice daily",
-                "Take 1 capsule by mouth once daily",
-                "Take 2 tablets by mouth twice daily",
-                "Inhale 2 puffs twice daily",
-                "Apply topically as directed",
-                "Take 1 tablet by mouth at bedtime",
-                "Take 1-2 tablets by mouth every 4-6 hours as needed",
-                "Inject subcutaneously as directed"
-            ]
-            sig = random.choice(sigs)
-            
-            # Copay
-            copay = round(random.uniform(5, 75), 2)
-            if 'rems' in med_info and med_info.get('rems'):
-                copay = round(random.uniform(50, 500), 2)  # Specialty meds more expensive
-            
-            prescription = {
-                'rx_number': f"RX{rx_counter:08d}",
-                'patient_id': patient['patient_id'],
-                'medication_name': medication_name,
-                'ndc': ndc,
-                'quantity': quantity,
-                'days_supply': days_supply,
-                'written_date': written_date.strftime('%Y-%m-%d'),
-                'fill_date': fill_date.strftime('%Y-%m-%d'),
-                'refill_number': 0,
-                'sig': sig,
-                'prescriber_npi': f"{random.randint(1000000000, 9999999999)}",
-                'copay': copay,
-                'condition': condition,
-                'is_rems': 'Yes' if med_info.get('rems', False) else 'No'
-            }
-            prescriptions.append(prescription)
-            rx_counter += 1
-            
-            # Add refills (1-3 refills for maintenance meds)
-            if condition in ['Hypertension', 'Type 2 Diabetes', 'Hyperlipidemia', 'Hypothyroidism']:
-                num_refills = random.randint(1, 3)
-                for refill in range(1, num_refills + 1):
-                    refill_date = fill_date + timedelta(days=days_supply * refill)
-                    if refill_date > END_DATE:
-                        break
-                    
-                    refill_rx = prescription.copy()
-                    refill_rx['fill_date'] = refill_date.strftime('%Y-%m-%d')
-                    refill_rx['refill_number'] = refill
-                    prescriptions.append(refill_rx)
+    # Secondary insurance (if applicable), any carrier other than the primary
+    has_secondary = np.flatnonzero(num_plans >= 2)
+    secondary_carrier = (primary_carrier[has_secondary]
+                         + rng.integers(1, len(INSURANCE_CARRIERS), len(has_secondary))) % len(INSURANCE_CARRIERS)
     
-    return pd.DataFrame(prescriptions)
+    # One row per plan, each patient's primary directly followed by its secondary
+    plan_patient = np.concatenate([np.arange(n), has_secondary])
+    order = np.argsort(plan_patient, kind='stable')
+    plan_patient = plan_patient[order]
+    carrier = np.concatenate([primary_carrier, secondary_carrier])[order]
+    rank = np.repeat(['Primary', 'Secondary'], [n, len(has_secondary)])[order]
+    m = len(plan_patient)
+    
+    carrier_columns = pd.DataFrame(INSURANCE_CARRIERS).iloc[carrier]
+    return pd.DataFrame({
+        'patient_id': patients_df['patient_id'].to_numpy()[plan_patient],
+        'insurance_rank': pd.Categorical(rank, categories=['Primary', 'Secondary']),
+        'carrier_name': pd.Categorical(carrier_columns['name']),
+        'rx_bin': pd.Categorical(carrier_columns['bin']),
+        'rx_pcn': pd.Categorical(carrier_columns['pcn']),
+        'rx_group': carrier_columns['group_prefix'].to_numpy() + np.char.mod('%d', rng.integers(10000, 100000, m)),
+        'cardholder_id': np.char.mod('%d', rng.integers(100000000, 1000000000, m)),
+        'person_code': np.char.mod('%02d', rng.integers(1, 5, m)),
+        'effective_date': pd.Timestamp(START_DATE),
+        'termination_date': pd.NaT
+    }, copy=False)
+
+def generate_prescriptions_and_transactions(patients_df, conditions, insurance_df, seed):
+    """Generate prescription history and its adjudication transactions in one pass
 
-def generate_adjudication_transactions(prescriptions_df, insurance_df):
-    """Generate insurance adjudication transactions"""
-    transactions = []
+    Every fill is billed once, so transactions are built from the prescription
+    arrays while they are still in scope rather than by re-reading the
+    finished prescriptions frame.
+    """
+    rng = np.random.default_rng(seed)
+    # Long-form (patient, disease) pairs; patients without conditions get no prescriptions
+    condition_patient, condition_disease = np.nonzero(conditions)
+    patient_codes, patient_rows = pd.factorize(condition_patient)
+    patient_ids = patients_df['patient_id'].to_numpy()[patient_rows]
+    conditions_per_patient = np.bincount(patient_codes)
+    first_condition = np.cumsum(conditions_per_patient) - conditions_per_patient
     
-    for _, rx in prescriptions_df.iterrows():
-        # Get patient's primary insurance
-        patient_insurance = insurance_df[
-            (insurance_df['patient_id'] == rx['patient_id']) & 
-            (insurance_df['insurance_rank'] == 'Primary')
-        ]
-        
-        if patient_insurance.empty:
-            continue
-        
-        insurance = patient_insurance.iloc[0]
-        
-        # 15% rejection rate
-        is_rejected = random.random() < 0.15
-        
-        if is_rejected:
-            reject_code = random.choice(list(REJECTION_CODES.keys()))
-            reject_message = REJECTION_CODES[reject_code]
-            status = 'Rejected'
-            paid_amount = 0.0
-        else:
-            reject_code = None
-            reject_message = None
-            status = 'Approved'
-            # AWP minus discount
-            awp = round(random.uniform(50, 800), 2)
-            paid_amount = round(awp * random.uniform(0.70, 0.95), 2)
-        
-        transaction = {
-            'transaction_id': f"TXN{hash(rx['rx_number'] + rx['fill_date']) % 10000000:07d}",
-            'rx_number': rx['rx_number'],
-            'patient_id': rx['patient_id'],
-            'fill_date': rx['fill_date'],
-            'rx_bin': insurance['rx_bin'],
-            'rx_pcn': insurance['rx_pcn'],
-            'rx_group': insurance['rx_group'],
-            'cardholder_id': insurance['cardholder_id'],
-            'ndc': rx['ndc'],
-            'quantity': rx['quantity'],
-            'days_supply': rx['days_supply'],
-            'submitted_amount': round(random.uniform(50, 800), 2),
-            'paid_amount': paid_amount,
-            'patient_pay': rx['copay'],
-            'status': status,
-            'reject_code': reject_code,
-            'reject_message': reject_message,
-            'submission_clarification_code': None,
-            'transaction_timestamp': rx['fill_date'] + 'T' + f"{random.randint(8,20):02d}:{random.randint(0,59):02d}:00"
-        }
-        transactions.append(transaction)
+    # Each patient gets 8-16 prescriptions over 2 years
+    num_prescriptions = rng.integers(8, 17, len(patient_ids))
+    rx_patient = np.repeat(np.arange(len(patient_ids)), num_prescriptions)
+    n = len(rx_patient)
+    
+    # Select a condition and medication
+    condition_idx = first_condition[rx_patient] + rng.integers(0, conditions_per_patient[rx_patient])
+    disease_idx = condition_disease[condition_idx]
+    med_idx = FIRST_MEDICATION[disease_idx] + rng.integers(0, MEDICATIONS_PER_DISEASE[disease_idx])
+    medication_name = MEDICATIONS[med_idx]
+    is_rems = DISEASE_IS_REMS[disease_idx]
+    
+    # Generate prescription dates (days after START_DATE)
+    written_offset = rng.integers(0, 731, n)
+    fill_offset = written_offset + rng.integers(0, 8, n)
+    
+    # Quantity and days supply: inhalers and insulin are fixed, 5% of the
+    # remaining prescriptions get aberrant dosing
+    dosing_class = MEDICATION_DOSING_CLASS[med_idx]
+    is_inhaler = dosing_class == DOSING_INHALER
+    is_insulin = dosing_class == DOSING_INSULIN
+    is_aberrant = (dosing_class == DOSING_STANDARD) & (rng.random(n) < 0.05)
+    quantity = np.select(
+        [is_inhaler, is_insulin, is_aberrant],
+        [1, rng.choice([1, 3, 5], n), rng.integers(1, 501, n)],
+        default=rng.choice([30, 60, 90], n)
+    )
+    days_supply = np.select(
+        [is_inhaler | is_insulin, is_aberrant],
+        [30, rng.integers(1, 181, n)],
+        default=quantity
+    )
+    
+    # Instructions (SIG)
+    sig = sample(rng, SIGS, n)
+    
+    # Copay (specialty REMS meds are more expensive)
+    copay = np.round(np.where(is_rems, rng.uniform(50, 500, n), rng.uniform(5, 75, n)), 2)
+    
+    # Add refills (1-3 refills for maintenance meds), stopping at the first
+    # refill that would fall after END_DATE
+    is_maintenance = np.isin(DISEASES[disease_idx], ['Hypertension', 'Type 2 Diabetes', 'Hyperlipidemia', 'Hypothyroidism'])
+    requested_refills = np.where(is_maintenance, rng.integers(1, 4, n), 0)
+    num_refills = np.minimum(requested_refills, ((END_DATE - START_DATE).days - fill_offset) // days_supply)
+    
+    start = pd.Timestamp(START_DATE)
+    prescriptions = pd.DataFrame({
+        'rx_number': np.char.mod('RX%08d', np.arange(1, n + 1)),
+        'patient_id': patient_ids[rx_patient],
+        'medication_name': pd.Categorical(medication_name),
+        'ndc': MEDICATION_NDCS[med_idx],
+        'quantity': quantity,
+        'days_supply': days_supply,
+        'written_date': start + pd.to_timedelta(written_offset, unit='D'),
+        'fill_date': start + pd.to_timedelta(fill_offset, unit='D'),
+        'refill_number': 0,
+        'sig': pd.Categorical(sig, categories=SIGS),
+        'prescriber_npi': np.char.mod('%d', rng.integers(1000000000, 10000000000, n)),
+        'copay': copay,
+        'condition': pd.Categorical.from_codes(disease_idx, categories=DISEASES),
+        'is_rems': pd.Categorical(np.where(is_rems, 'Yes', 'No'), categories=['No', 'Yes'])
+    })
+    
+    # Refill rows are copies of their prescription with a later fill date
+    refill_rows = np.repeat(np.arange(n), num_refills)
+    refill_number = np.arange(len(refill_rows)) - np.repeat(np.cumsum(num_refills) - num_refills, num_refills) + 1
+    refill_offset = fill_offset[refill_rows] + days_supply[refill_rows] * refill_number
+    refills = prescriptions.iloc[refill_rows].assign(
+        refill_number=refill_number,
+        fill_date=start + pd.to_timedelta(refill_offset, unit='D')
+    )
     
-    return pd.DataFrame(transactions)
+    # Refills keep their prescription's index, so a stable sort places them
+    # directly after it; the sorted index maps each fill to its prescription
+    prescriptions_df = pd.concat([prescriptions, refills]).sort_index(kind='stable')
+    fill_rx = prescriptions_df.index.to_numpy()
+    prescriptions_df = prescriptions_df.reset_index(drop=True)
+    
+    # Every fill is billed to the patient's (first) primary plan, looked up
+    # once per patient; fills for patients without one are dropped
+    primary = insurance_df[insurance_df['insurance_rank'] == 'Primary'].drop_duplicates('patient_id')
+    primary = primary.set_index('patient_id')[['rx_bin', 'rx_pcn', 'rx_group', 'cardholder_id']]
+    plan_idx = primary.index.get_indexer(patient_ids)[rx_patient[fill_rx]]
+    claims = prescriptions_df[plan_idx >= 0].reset_index(drop=True)
+    # Plan fields are gathered straight from the column arrays by position,
+    # without building an intermediate frame of matched plan rows
+    plans = {column: primary[column].array[plan_idx[plan_idx >= 0]] for column in primary.columns}
+    n = len(claims)
+    
+    # 15% rejection rate
+    is_rejected = rng.random(n) < 0.15
+    reject_idx = rng.integers(0, len(REJECT_CODES), n)
+    
+    # AWP minus discount
+    awp = np.round(rng.uniform(50, 800, n), 2)
+    paid_amount = np.where(is_rejected, 0.0, np.round(awp * rng.uniform(0.70, 0.95, n), 2))
+    
+    # Deterministic 7-digit IDs hashed from rx number and fill date
+    txn_hash = pd.util.hash_pandas_object(claims[['rx_number', 'fill_date']], index=False).to_numpy()
+    
+    # Submitted between 08:00 and 20:59 on the fill date
+    transaction_times = pd.to_timedelta(rng.integers(8, 21, n) * 3600 + rng.integers(0, 60, n) * 60, unit='s')
+    
+    transactions_df = pd.DataFrame({
+        'transaction_id': np.char.mod('TXN%07d', txn_hash % 10000000),
+        'rx_number': claims['rx_number'],
+        'patient_id': claims['patient_id'],
+        'fill_date': claims['fill_date'],
+        'rx_bin': plans['rx_bin'],
+        'rx_pcn': plans['rx_pcn'],
+        'rx_group': plans['rx_group'],
+        'cardholder_id': plans['cardholder_id'],
+        'ndc': claims['ndc'],
+        'quantity': claims['quantity'],
+        'days_supply': claims['days_supply'],
+        'submitted_amount': np.round(rng.uniform(50, 800, n), 2),
+        'paid_amount': paid_amount,
+        'patient_pay': claims['copay'],
+        'status': pd.Categorical(np.where(is_rejected, 'Rejected', 'Approved'), categories=['Approved', 'Rejected']),
+        'reject_code': pd.Categorical(np.where(is_rejected, REJECT_CODES[reject_idx], None), categories=REJECT_CODES),
+        'reject_message': pd.Categorical(np.where(is_rejected, REJECT_MESSAGES[reject_idx], None)),
+        'submission_clarification_code': None,
+        'transaction_timestamp': claims['fill_date'] + transaction_times
+    })
+    return prescriptions_df, transactions_df
+
+def write_parquet(df, filename):
+    """Write a DataFrame to OUTPUT_DIR as snappy-compressed, dictionary-encoded Parquet"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Calendar dates are held as datetime64 in memory and stored as Parquet
+    # dates; transaction_timestamp keeps its time of day
+    schema = pa.schema(
+        [field.with_type(pa.date32()) if field.name.endswith('_date') or field.name == 'date_of_birth' else field
+         for field in table.schema],
+        metadata=table.schema.metadata
+    )
+    pq.write_table(
+        table.cast(schema),
+        f"{OUTPUT_DIR}/{filename}",
+        compression='snappy',
+        use_dictionary=True
+    )
 
 def main():
     """Main execution function"""
@@ -530,39 +622,45 @@ def main():
     print("HEALTHCARE DATA GENERATION - PHARMACY SYSTEM")
     print("=" * 60)
     
-    print("\n[1/5] Generating patient demographics...")
-    patients_df = generate_patient_demographics()
-    print(f"   ✓ Generated {len(patients_df)} patients")
-    
-    print("\n[2/5] Generating insurance profiles...")
-    insurance_df = generate_insurance_profiles(patients_df)
-    print(f"   ✓ Generated {len(insurance_df)} insurance records")
-    
-    print("\n[3/5] Generating prescriptions...")
-    prescriptions_df = generate_prescriptions(patients_df)
-    print(f"   ✓ Generated {len(prescriptions_df)} prescriptions")
-    rems_count = len(prescriptions_df[prescriptions_df['is_rems'] == 'Yes'])
-    print(f"   ✓ REMS medications: {rems_count}")
-    
-    print("\n[4/5] Generating insurance adjudication transactions...")
-    transactions_df = generate_adjudication_transactions(prescriptions_df, insurance_df)
-    print(f"   ✓ Generated {len(transactions_df)} transactions")
-    rejected = len(transactions_df[transactions_df['status'] == 'Rejected'])
-    print(f"   ✓ Rejected claims: {rejected} ({rejected/len(transactions_df)*100:.1f}%)")
-    
-    print("\n[5/5] Saving data to CSV files...")
-    patients_df.to_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/pharmacy_patients.csv', index=False)
-    insurance_df.to_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/pharmacy_insurance.csv', index=False)
-    prescriptions_df.to_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/pharmacy_prescriptions.csv', index=False)
-    transactions_df.to_csv('/Users/jpoul/OneDrive/Documents/CS Development/Source/Pharmacy/healthcare-data-lake-project/data_generation/pharmacy_transactions.csv', index=False)
-    print("   ✓ All files saved successfully")
+    # Parquet writes run on background threads as soon as each table is ready,
+    # overlapping compression and disk I/O with the remaining generation work
+    with ThreadPoolExecutor(max_workers=4) as writer:
+        print("\n[1/4] Generating patient demographics...")
+        demographics_seed, insurance_seed, prescriptions_seed = np.random.SeedSequence(SEED).spawn(3)
+        patients_df, conditions = generate_patient_demographics(demographics_seed)
+        writes = [writer.submit(write_parquet, patients_df, 'pharmacy_patients.parquet')]
+        print(f"   ✓ Generated {len(patients_df)} patients")
+        
+        print("\n[2/4] Generating insurance profiles...")
+        insurance_df = generate_insurance_profiles(patients_df, insurance_seed)
+        writes.append(writer.submit(write_parquet, insurance_df, 'pharmacy_insurance.parquet'))
+        print(f"   ✓ Generated {len(insurance_df)} insurance records")
+        
+        print("\n[3/4] Generating prescriptions and adjudication transactions...")
+        prescriptions_df, transactions_df = generate_prescriptions_and_transactions(
+            patients_df, conditions, insurance_df, prescriptions_seed
+        )
+        writes.append(writer.submit(write_parquet, prescriptions_df, 'pharmacy_prescriptions.parquet'))
+        writes.append(writer.submit(write_parquet, transactions_df, 'pharmacy_transactions.parquet'))
+        print(f"   ✓ Generated {len(prescriptions_df)} prescriptions")
+        rems_count = len(prescriptions_df[prescriptions_df['is_rems'] == 'Yes'])
+        print(f"   ✓ REMS medications: {rems_count}")
+        print(f"   ✓ Generated {len(transactions_df)} transactions")
+        rejected = len(transactions_df[transactions_df['status'] == 'Rejected'])
+        print(f"   ✓ Rejected claims: {rejected} ({rejected/len(transactions_df)*100:.1f}%)")
+        
+        # Wait for all writes (re-raising any write error)
+        print("\n[4/4] Saving data to Parquet files...")
+        for write in writes:
+            write.result()
+        print("   ✓ All files saved successfully")
     
     # Summary statistics
     print("\n" + "=" * 60)
     print("DATA GENERATION SUMMARY")
     print("=" * 60)
     print(f"Patients: {len(patients_df)}")
-    print(f"  - With conditions: {len(patients_df[patients_df['conditions'] != 'None'])}")
+    print(f"  - With conditions: {conditions.any(axis=1).sum()}")
     print(f"  - With drug allergies: {len(patients_df[patients_df['drug_allergies'] != 'NKDA'])}")
     print(f"Insurance Records: {len(insurance_df)}")
     print(f"Prescriptions: {len(prescriptions_df)}")